@@ -1,31 +1,56 @@
-#!/home/sb4/venv/bin/python3.11
+#!/usr/bin/env python3
 """
 Raspberry Pi 5 File Management Script
-- Deletes specified files from a target folder
-- Downloads files from GitHub repository
+- Downloads files from GitHub repository, replacing old copies atomically
+- Cleans up stale partial downloads from interrupted runs
 - Logs completion to a text file
 - Automatically retries on failure with configurable delay
+
+One copy serves every Pi: the base folder comes from FM_USER_HOME (or
+the current user's home), and the retry policy can be overridden with
+--max-retries / --retry-delay.
 """
 
+import argparse
+import concurrent.futures
+import errno
+import json
 import os
+import random
 import sys
-import requests
 import datetime
 import time
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
+# Optional: python-liburing lets the delete phase submit all unlinks to the
+# kernel in a single batch (one io_uring_enter instead of one syscall each)
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+# Status lines are buffered here and written in one flush - on the Pi's
+# journald-backed stdout every individual print costs a syscall plus IPC
+_OUT = []
+
+def emit(message):
+    """Queue a status line for the next buffered stdout flush."""
+    _OUT.append(message)
+
+def flush_output():
+    """Write all queued status lines to stdout in a single syscall."""
+    if _OUT:
+        sys.stdout.write('\n'.join(_OUT) + '\n')
+        sys.stdout.flush()
+        _OUT.clear()
+
+# Base directory for this user's deployment; FM_USER_HOME lets one copy of
+# the script serve machines whose install lives under a different account
+HOME_DIR = os.environ.get('FM_USER_HOME', os.path.expanduser('~'))
+
 # Configuration - Modify these variables as needed
 CONFIG = {
-    # Local folder where files should be deleted from
-    'delete_folder': '/home/sb4/MagicMirror/modules/MMM-Planefinder',
-    
-    # Files to delete (just filenames)
-    'files_to_delete': [
-        'aircraft.csv',
-        'airports.csv', 
-        'airlines.csv'
-    ],
-    
     # GitHub repository information
     'github_user': 'kds54',           # Replace with GitHub username
     'github_repo': 'MMM-Planefinder',    # Replace with repository name
@@ -39,107 +64,356 @@ CONFIG = {
     ],
     
     # Local folder where downloaded files should be placed
-    'download_folder': '/home/sb4/MagicMirror/modules/MMM-Planefinder',
-    
+    'download_folder': os.path.join(HOME_DIR, 'MagicMirror/modules/MMM-Planefinder'),
+
     # Log file path
-    'log_file': '/home/sb4/venv/FileManager/FileManager_Log.txt',
+    'log_file': os.path.join(HOME_DIR, 'venv/FileManager/FileManager_Log.txt'),
+
+    # Sidecar cache of ETag headers (lets unchanged files skip the download)
+    'etag_file': os.path.join(HOME_DIR, 'venv/FileManager/FileManager_ETags.json'),
     
     # Retry configuration
     'max_retries': 3,           # Maximum number of retry attempts
     'retry_delay_minutes': 2,   # Minutes to wait between retries
 }
 
+# Shared session so all downloads reuse one keepalive HTTPS connection
+# instead of paying a fresh TCP + TLS handshake per file. Built lazily so
+# the delete phase never pays the ~100 ms cost of importing requests.
+SESSION = None
+
+def get_session():
+    """Import requests and build the pooled download session on first use."""
+    global SESSION
+    if SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter, Retry
+        SESSION = requests.Session()
+        SESSION.mount('https://', HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=len(CONFIG['files_to_download']),
+            max_retries=Retry(total=0)
+        ))
+    return SESSION
+
 def ensure_directory_exists(directory_path):
     """Create directory if it doesn't exist."""
     Path(directory_path).mkdir(parents=True, exist_ok=True)
 
-def delete_files():
-    """Delete specified files from the target folder."""
+def load_etags():
+    """Load the cached {filename: etag} map from the sidecar file."""
+    try:
+        with open(CONFIG['etag_file'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_etags(etags):
+    """Persist the {filename: etag} map next to the log file."""
+    try:
+        etag_dir = os.path.dirname(CONFIG['etag_file'])
+        if etag_dir:
+            ensure_directory_exists(etag_dir)
+        with open(CONFIG['etag_file'], 'w', encoding='utf-8') as f:
+            json.dump(etags, f, indent=2)
+    except OSError as e:
+        emit(f"[WARN] Could not save ETag cache: {str(e)}")
+
+def io_uring_available():
+    """Check for io_uring unlink support (liburing installed, Linux >= 5.6)."""
+    if liburing is None or not hasattr(os, 'uname') or sys.platform != 'linux':
+        return False
+    # Newer liburing releases renamed the API wholesale (io_uring -> Ring,
+    # io_uring_prep_unlinkat -> io_uring_prep_unlink), so check for every
+    # symbol unlink_batch calls rather than trusting the import alone
+    needed = (
+        'io_uring', 'io_uring_cqe', 'io_uring_queue_init', 'io_uring_get_sqe',
+        'io_uring_prep_unlinkat', 'io_uring_submit', 'io_uring_wait_cqe',
+        'io_uring_cqe_seen', 'io_uring_queue_exit',
+    )
+    if not all(hasattr(liburing, name) for name in needed):
+        return False
+    try:
+        release = os.uname().release.split('-')[0]
+        major, minor = (int(part) for part in release.split('.')[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 6)
+
+def unlink_batch(file_paths):
+    """Unlink all paths in one io_uring submission.
+
+    Returns one kernel result code per path (0 on success, negative errno
+    on failure), in the same order as ``file_paths``.
+    """
+    ring = liburing.io_uring()
+    liburing.io_uring_queue_init(8, ring, 0)
+    try:
+        for index, path in enumerate(file_paths):
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_unlinkat(sqe, path.encode())
+            # 1-based token: python-liburing rejects a user_data of 0
+            sqe.user_data = index + 1
+        liburing.io_uring_submit(ring)
+
+        results = [None] * len(file_paths)
+        cqe = liburing.io_uring_cqe()
+        for _ in file_paths:
+            liburing.io_uring_wait_cqe(ring, cqe)
+            results[cqe.user_data - 1] = cqe.res
+            liburing.io_uring_cqe_seen(ring, cqe)
+        return results
+    finally:
+        liburing.io_uring_queue_exit(ring)
+
+def cleanup_temp_files():
+    """Remove orphan .tmp files left behind by interrupted downloads.
+
+    Downloads land in <name>.tmp and are renamed into place only on
+    success, so anything still matching *.tmp is a dead partial file.
+    """
     deleted_files = []
     errors = []
-    
-    for filename in CONFIG['files_to_delete']:
-        file_path = os.path.join(CONFIG['delete_folder'], filename)
+
+    # One directory read finds every orphan, instead of the kernel
+    # walking the path once per candidate file
+    try:
+        targets = [entry.name for entry in os.scandir(CONFIG['download_folder'])
+                   if entry.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return deleted_files, errors
+
+    # Fast path: queue every unlink and cross into the kernel once
+    if targets and io_uring_available():
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                deleted_files.append(filename)
-                print(f"[OK] Deleted: {filename}")
-            else:
-                print(f"[WARN] File not found (skipping): {filename}")
+            paths = [os.path.join(CONFIG['download_folder'], f) for f in targets]
+            for filename, res in zip(targets, unlink_batch(paths)):
+                if res == 0:
+                    deleted_files.append(filename)
+                    emit(f"[OK] Removed stale file: {filename}")
+                elif res != -errno.ENOENT:
+                    error_msg = f"Error deleting {filename}: {os.strerror(-res)}"
+                    errors.append(error_msg)
+                    emit(f"[ERROR] {error_msg}")
+            return deleted_files, errors
         except Exception as e:
+            # The fast path is an optimization, never a requirement: any
+            # failure (ring setup, binding quirks) falls through to the
+            # per-file loop rather than taking down the whole run
+            emit(f"[WARN] io_uring unavailable ({str(e)}), using sequential deletes")
+
+    for filename in targets:
+        file_path = os.path.join(CONFIG['download_folder'], filename)
+        try:
+            os.unlink(file_path)
+            deleted_files.append(filename)
+            emit(f"[OK] Removed stale file: {filename}")
+        except FileNotFoundError:
+            pass  # Lost a race with another cleanup; already gone
+        except OSError as e:
             error_msg = f"Error deleting {filename}: {str(e)}"
             errors.append(error_msg)
-            print(f"[ERROR] {error_msg}")
-    
+            emit(f"[ERROR] {error_msg}")
+
     return deleted_files, errors
 
-def download_file_from_github(file_path, local_filename=None):
-    """Download a single file from GitHub repository."""
+def github_raw_url(file_path):
+    """Build the raw.githubusercontent.com URL for a repo file."""
+    return (f"https://raw.githubusercontent.com/{CONFIG['github_user']}/"
+            f"{CONFIG['github_repo']}/{CONFIG['github_branch']}/{file_path}")
+
+def file_is_current(file_path, session):
+    """HEAD the remote file and compare size and mtime with the local copy.
+
+    A match proves the on-disk file is already current without an ETag,
+    costing only a zero-byte metadata round-trip instead of the full body.
+    """
+    local_path = os.path.join(CONFIG['download_folder'], os.path.basename(file_path))
+    try:
+        st = os.stat(local_path)
+    except OSError:
+        return False
+
+    import requests
+
+    try:
+        # Ask for the identity encoding so Content-Length is the plain
+        # file size; the default gzip negotiation would report the
+        # compressed size, which never matches the decoded bytes on disk
+        response = session.head(github_raw_url(file_path), timeout=30,
+                                headers={'Accept-Encoding': 'identity'})
+        if response.status_code != 200:
+            return False
+        length = response.headers.get('Content-Length')
+        modified = response.headers.get('Last-Modified')
+        if length is None or modified is None:
+            return False
+        return (int(length) == st.st_size
+                and parsedate_to_datetime(modified).timestamp() == st.st_mtime)
+    except (requests.exceptions.RequestException, TypeError, ValueError):
+        return False
+
+def download_file_from_github(file_path, etags, session, local_filename=None):
+    """Download a single file from GitHub repository.
+
+    Sends a conditional GET using the cached ETag; a 304 response means
+    the on-disk copy is still current and the body transfer is skipped.
+    Returns (success, error, cached, retryable) - retryable is False for
+    failures that repeating the request cannot fix.
+    """
     if local_filename is None:
         local_filename = os.path.basename(file_path)
-    
-    # Construct GitHub raw URL
-    url = f"https://raw.githubusercontent.com/{CONFIG['github_user']}/{CONFIG['github_repo']}/{CONFIG['github_branch']}/{file_path}"
-    
+
+    url = github_raw_url(file_path)
+    local_path = os.path.join(CONFIG['download_folder'], local_filename)
+
+    # Only claim a cached copy if the file is actually still on disk -
+    # the sidecar lives in a different tree than the CSVs, so a module
+    # reinstall can remove the files while the ETags survive
+    headers = {}
+    if etags.get(local_filename):
+        if os.path.exists(local_path):
+            headers['If-None-Match'] = etags[local_filename]
+        else:
+            del etags[local_filename]
+
+    # Cheap: requests is already in sys.modules once the session exists
+    import requests
+
     try:
-        print(f"Downloading: {file_path}")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Save file to download folder
-        local_path = os.path.join(CONFIG['download_folder'], local_filename)
-        with open(local_path, 'wb') as f:
-            f.write(response.content)
-        
-        print(f"[OK] Downloaded: {local_filename}")
-        return True, None
-        
+        emit(f"Downloading: {file_path}")
+        with session.get(url, timeout=30, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                emit(f"[OK] Unchanged (cached): {local_filename}")
+                return True, None, True, True
+
+            response.raise_for_status()  # Raise an exception for bad status codes
+
+            # Stream to disk in 64 KiB chunks so peak memory stays constant
+            # no matter how large the CSV grows. iter_content decodes
+            # Content-Encoding, so gzipped responses land as plain CSV;
+            # copying response.raw would write the compressed wire bytes.
+            tmp_path = local_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+
+            # Atomic on the same filesystem: the module sees either the old
+            # file or the complete new one, never a truncated download
+            os.replace(tmp_path, local_path)
+
+            if response.headers.get('ETag'):
+                etags[local_filename] = response.headers['ETag']
+
+            # Pin mtime to the server's Last-Modified so the HEAD
+            # precheck can recognize this copy on later runs
+            if response.headers.get('Last-Modified'):
+                try:
+                    mtime = parsedate_to_datetime(response.headers['Last-Modified']).timestamp()
+                    os.utime(local_path, (mtime, mtime))
+                except (TypeError, ValueError):
+                    pass
+
+        emit(f"[OK] Downloaded: {local_filename}")
+        return True, None, False, True
+
+    except requests.exceptions.HTTPError as e:
+        # A 4xx means the request itself is wrong (renamed file, bad
+        # branch) and repeating it cannot help; 408/429 and 5xx can
+        status = e.response.status_code if e.response is not None else None
+        retryable = status is None or status in (408, 429) or status >= 500
+        error_msg = f"Error downloading {file_path}: {str(e)}"
+        emit(f"[ERROR] {error_msg}")
+        return False, error_msg, False, retryable
+
     except requests.exceptions.RequestException as e:
+        # Connection errors and timeouts are transient by nature
         error_msg = f"Error downloading {file_path}: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        return False, error_msg
+        emit(f"[ERROR] {error_msg}")
+        return False, error_msg, False, True
 
 def download_github_files():
-    """Download all specified files from GitHub."""
+    """Download all specified files from GitHub.
+
+    Returns (downloaded_files, errors, retryable) - retryable is True
+    when at least one failure might succeed on a later attempt.
+    """
     downloaded_files = []
     errors = []
+    retryable = False
     
     # Ensure download directory exists
     ensure_directory_exists(CONFIG['download_folder'])
-    
-    for file_path in CONFIG['files_to_download']:
-        success, error = download_file_from_github(file_path)
+
+    etags = load_etags()
+    session = get_session()
+
+    # HEAD precheck for files with no cached ETag (first run, or a lost
+    # sidecar): matching size + mtime proves the on-disk copy is current
+    # for the cost of a zero-byte metadata round-trip. Files with an ETag
+    # skip this - their conditional GET already avoids the body transfer.
+    to_fetch = list(CONFIG['files_to_download'])
+    unverified = [p for p in to_fetch if not etags.get(os.path.basename(p))]
+    if unverified:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(unverified)) as executor:
+            checks = list(executor.map(lambda path: file_is_current(path, session), unverified))
+        for file_path, current in zip(unverified, checks):
+            if current:
+                local_filename = os.path.basename(file_path)
+                emit(f"[OK] Up to date (metadata match): {local_filename}")
+                downloaded_files.append(local_filename)
+                to_fetch.remove(file_path)
+
+    # Download the rest in parallel - the downloads are network-bound, so
+    # fanning them out takes roughly as long as the slowest single file
+    results = []
+    if to_fetch:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+            results = list(executor.map(
+                lambda path: download_file_from_github(path, etags, session),
+                to_fetch
+            ))
+
+    save_etags(etags)
+
+    for file_path, (success, error, cached, can_retry) in zip(to_fetch, results):
         if success:
             downloaded_files.append(os.path.basename(file_path))
         else:
             errors.append(error)
-    
-    return downloaded_files, errors
+            retryable = retryable or can_retry
+
+    return downloaded_files, errors, retryable
 
 def log_completion(deleted_files, downloaded_files, errors, attempt_number=1):
     """Write completion entry to log file (overwrites existing content)."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     attempt_text = f" (Attempt {attempt_number})" if attempt_number > 1 else ""
-    
-    log_entry = f"""{'='*60}
-File Management Script Execution{attempt_text}
-Timestamp: {timestamp}
-{'='*60}
 
-DELETED FILES ({len(deleted_files)}):
-{chr(10).join(f"  - {f}" for f in deleted_files) if deleted_files else "  None"}
-
-DOWNLOADED FILES ({len(downloaded_files)}):
-{chr(10).join(f"  - {f}" for f in downloaded_files) if downloaded_files else "  None"}
-
-ERRORS ({len(errors)}):
-{chr(10).join(f"  - {e}" for e in errors) if errors else "  None"}
-
-Status: {"COMPLETED WITH ERRORS" if errors else "COMPLETED SUCCESSFULLY"}
-{'='*60}
-"""
+    # Build the entry as a list of lines and join once at the end
+    lines = [
+        '=' * 60,
+        f"File Management Script Execution{attempt_text}",
+        f"Timestamp: {timestamp}",
+        '=' * 60,
+        '',
+    ]
+    for heading, items in [
+        ('DELETED FILES', deleted_files),
+        ('DOWNLOADED FILES', downloaded_files),
+        ('ERRORS', errors),
+    ]:
+        lines.append(f"{heading} ({len(items)}):")
+        if items:
+            lines.extend(f"  - {item}" for item in items)
+        else:
+            lines.append("  None")
+        lines.append('')
+    lines.append(f"Status: {'COMPLETED WITH ERRORS' if errors else 'COMPLETED SUCCESSFULLY'}")
+    lines.append('=' * 60)
+    lines.append('')
+    log_entry = '\n'.join(lines)
     
     try:
         # Ensure log directory exists
@@ -147,112 +421,153 @@ Status: {"COMPLETED WITH ERRORS" if errors else "COMPLETED SUCCESSFULLY"}
         if log_dir:
             ensure_directory_exists(log_dir)
         
-        # Use 'w' mode to overwrite the file instead of 'a' to append
-        with open(CONFIG['log_file'], 'w', encoding='utf-8') as f:
-            f.write(log_entry)
-        
-        print(f"[OK] Log entry written to: {CONFIG['log_file']}")
+        # Write the whole entry with raw os.write calls - the log is small
+        # and single-shot, so this skips the buffered-writer machinery and
+        # normally lands in a single write() syscall. O_TRUNC keeps the
+        # overwrite-not-append behavior.
+        data = log_entry.encode('utf-8')
+        fd = os.open(CONFIG['log_file'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            offset = 0
+            while offset < len(data):
+                offset += os.write(fd, view[offset:])
+        finally:
+            os.close(fd)
+
+        emit(f"[OK] Log entry written to: {CONFIG['log_file']}")
         return True
         
     except Exception as e:
-        print(f"[ERROR] Error writing to log file: {str(e)}")
+        emit(f"[ERROR] Error writing to log file: {str(e)}")
         return False
 
 def run_file_management():
     """Execute the file management operations once."""
     all_errors = []
-    
-    # Step 1: Delete files
-    print("Step 1: Deleting files...")
-    deleted_files, delete_errors = delete_files()
-    all_errors.extend(delete_errors)
-    
-    # Step 2: Download files from GitHub
-    print("Step 2: Downloading files from GitHub...")
-    downloaded_files, download_errors = download_github_files()
+
+    # Step 1: Download files from GitHub. Downloads run first and replace
+    # files in place, so a failed run never leaves the module without data.
+    emit("Step 1: Downloading files from GitHub...")
+    downloaded_files, download_errors, retryable = download_github_files()
     all_errors.extend(download_errors)
-    
-    return deleted_files, downloaded_files, all_errors
+
+    # Step 2: Clean up partial downloads left by interrupted runs
+    emit("Step 2: Cleaning up stale temp files...")
+    deleted_files, delete_errors = cleanup_temp_files()
+    all_errors.extend(delete_errors)
+    # Cleanup failures (e.g. a transient EBUSY) keep their retry budget
+    retryable = retryable or bool(delete_errors)
+
+    return deleted_files, downloaded_files, all_errors, retryable
+
+def print_summary(tag, attempt, deleted_files, downloaded_files, all_errors, log_success, show_errors=False):
+    """Emit the ===-bannered summary block shared by every exit path."""
+    emit("\n" + "=" * 60)
+    emit(tag)
+    emit("=" * 60)
+    emit(f"Attempt: {attempt}")
+    emit(f"Files deleted: {len(deleted_files)}")
+    emit(f"Files downloaded: {len(downloaded_files)}")
+    emit(f"Errors encountered: {len(all_errors)}")
+    emit(f"Log file updated: {'Yes' if log_success else 'No'}")
+    if show_errors and all_errors:
+        emit("Errors encountered:")
+        for error in all_errors:
+            emit(f"  - {error}")
+
+def wait_for_retry(attempt):
+    """Sleep before the next attempt using exponential backoff with jitter.
+
+    Delays grow 30 s, 60 s, 120 s, ... capped at the configured retry
+    delay, with +/-25% jitter so a fleet of Pis that lost the network at
+    the same moment doesn't hammer GitHub again in lockstep.
+    """
+    delay_seconds = min(CONFIG['retry_delay_minutes'] * 60, 30 * 2 ** (attempt - 1))
+    delay_seconds *= random.uniform(0.75, 1.25)
+    emit(f"\nWaiting {delay_seconds:.0f} seconds before retry...")
+    # Flush so progress is visible during the wait
+    flush_output()
+    time.sleep(delay_seconds)
+
+def parse_args(argv=None):
+    """Parse command-line overrides for the retry configuration."""
+    parser = argparse.ArgumentParser(description='Refresh the MMM-Planefinder CSVs from GitHub.')
+    parser.add_argument('--max-retries', type=int, default=CONFIG['max_retries'],
+                        help='maximum number of attempts; 1 disables retrying (default: %(default)s)')
+    parser.add_argument('--retry-delay', type=float, default=CONFIG['retry_delay_minutes'],
+                        metavar='MINUTES',
+                        help='minutes to wait between retries (default: %(default)s)')
+    return parser.parse_args(argv)
 
 def main():
     """Main execution function with retry logic."""
-    print("Starting Raspberry Pi File Management Script")
-    print(f"Timestamp: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Max retries: {CONFIG['max_retries']}")
-    print(f"Retry delay: {CONFIG['retry_delay_minutes']} minutes")
-    print("-" * 60)
+    args = parse_args()
+    CONFIG['max_retries'] = max(1, args.max_retries)
+    CONFIG['retry_delay_minutes'] = args.retry_delay
+
+    emit("Starting Raspberry Pi File Management Script")
+    emit(f"Timestamp: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    emit(f"Max retries: {CONFIG['max_retries']}")
+    emit(f"Retry delay: {CONFIG['retry_delay_minutes']} minutes")
+    emit("-" * 60)
     
     for attempt in range(1, CONFIG['max_retries'] + 1):
-        print(f"\n{'='*20} ATTEMPT {attempt} {'='*20}")
+        emit(f"\n{'='*20} ATTEMPT {attempt} {'='*20}")
         
         try:
             # Execute file management operations
-            deleted_files, downloaded_files, all_errors = run_file_management()
+            deleted_files, downloaded_files, all_errors, retryable = run_file_management()
             
             # Log the attempt
-            print(f"\nStep 3: Writing to log file...")
+            emit(f"\nStep 3: Writing to log file...")
             log_success = log_completion(deleted_files, downloaded_files, all_errors, attempt)
             
             # Check if successful
             if not all_errors:
-                # Success! Print summary and exit
-                print("\n" + "="*60)
-                print("EXECUTION SUMMARY - SUCCESS")
-                print("="*60)
-                print(f"Attempt: {attempt}")
-                print(f"Files deleted: {len(deleted_files)}")
-                print(f"Files downloaded: {len(downloaded_files)}")
-                print(f"Errors encountered: {len(all_errors)}")
-                print(f"Log file updated: {'Yes' if log_success else 'No'}")
-                print("\n[OK] Script completed successfully!")
+                print_summary("EXECUTION SUMMARY - SUCCESS", attempt,
+                              deleted_files, downloaded_files, all_errors, log_success)
+                emit("\n[OK] Script completed successfully!")
                 sys.exit(0)
-            
+
             else:
                 # Has errors, decide whether to retry
-                print("\n" + "="*60)
-                print(f"ATTEMPT {attempt} SUMMARY - FAILED")
-                print("="*60)
-                print(f"Files deleted: {len(deleted_files)}")
-                print(f"Files downloaded: {len(downloaded_files)}")
-                print(f"Errors encountered: {len(all_errors)}")
-                print(f"Log file updated: {'Yes' if log_success else 'No'}")
-                
-                if attempt < CONFIG['max_retries']:
-                    delay_seconds = CONFIG['retry_delay_minutes'] * 60
-                    print(f"\n[WARN] Attempt {attempt} failed with errors. Retrying in {CONFIG['retry_delay_minutes']} minutes...")
-                    print("Errors encountered:")
-                    for error in all_errors:
-                        print(f"  - {error}")
-                    print(f"\nWaiting {CONFIG['retry_delay_minutes']} minutes before retry...")
-                    time.sleep(delay_seconds)
+                print_summary(f"ATTEMPT {attempt} SUMMARY - FAILED", attempt,
+                              deleted_files, downloaded_files, all_errors, log_success,
+                              show_errors=True)
+
+                if attempt < CONFIG['max_retries'] and retryable:
+                    emit(f"\n[WARN] Attempt {attempt} failed with errors. Retrying...")
+                    wait_for_retry(attempt)
                 else:
-                    # Final attempt failed
-                    print(f"\n[ERROR] All {CONFIG['max_retries']} attempts failed. Script execution terminated.")
-                    print("Final errors encountered:")
-                    for error in all_errors:
-                        print(f"  - {error}")
+                    # Final attempt failed, or nothing left worth retrying
+                    if not retryable:
+                        emit(f"\n[ERROR] Non-retryable failure. Script execution terminated.")
+                    else:
+                        emit(f"\n[ERROR] All {CONFIG['max_retries']} attempts failed. Script execution terminated.")
                     sys.exit(1)
         
         except Exception as e:
-            print(f"\n[ERROR] Unexpected error in attempt {attempt}: {str(e)}")
+            emit(f"\n[ERROR] Unexpected error in attempt {attempt}: {str(e)}")
             if attempt < CONFIG['max_retries']:
-                delay_seconds = CONFIG['retry_delay_minutes'] * 60
-                print(f"Retrying in {CONFIG['retry_delay_minutes']} minutes...")
-                time.sleep(delay_seconds)
+                wait_for_retry(attempt)
             else:
-                print(f"[ERROR] All {CONFIG['max_retries']} attempts failed due to unexpected errors.")
+                emit(f"[ERROR] All {CONFIG['max_retries']} attempts failed due to unexpected errors.")
                 sys.exit(1)
     
     # This should never be reached, but just in case
-    print("[ERROR] Unexpected end of retry loop")
+    emit("[ERROR] Unexpected end of retry loop")
     sys.exit(1)
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("\n\n[WARN] Script interrupted by user")
+        emit("\n\n[WARN] Script interrupted by user")
         sys.exit(1)
     except Exception as e:
-        print(f"\n[ERROR] Unexpected error: {str(e)}")
-        sys.exit(1)
\ No newline at end of file
+        emit(f"\n[ERROR] Unexpected error: {str(e)}")
+        sys.exit(1)
+    finally:
+        # sys.exit raises SystemExit, so this covers every exit path
+        flush_output()
\ No newline at end of file